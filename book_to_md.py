@@ -1,27 +1,50 @@
 import fitz  # PyMuPDF
+import functools
 import sys
 import re
 import os
+import multiprocessing
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple, Optional
-from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Optional, Union
 
 # Constants
 TEXT_BLOCK_TYPE = 0
 DEFAULT_OUTPUT_FILENAME = "output.md"
+MARKDOWN_EXTRACTOR_FLAG = "--markdown-extractor"
 PDF_HEADER_MARGIN = 50
 PDF_FOOTER_MARGIN = 50
+# Text extraction flags: the default "dict" flags minus image content, which is never used
+TEXTPAGE_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+# Files smaller than this are read into memory and opened from the buffer
+MAX_IN_MEMORY_FILE_SIZE = 200 * 1024 * 1024
+# Span texts up to this length (punctuation, short words) are interned when cached
+MAX_INTERNED_TEXT_LENGTH = 4
+# Number of Markdown fragments joined into each chunk written to the output file
+MARKDOWN_CHUNK_PARTS = 1024
+# Minimum number of pages each worker process must get before extraction runs in parallel
+MIN_PAGES_PER_WORKER = 16
 FONT_TYPES = {
     "text": 0
 }
 
 # Font detection keywords for code blocks
 CODE_FONT_KEYWORDS = ("mono", "courier", "code", "consolas")
+_CODE_FONT_RE = re.compile("|".join(map(re.escape, CODE_FONT_KEYWORDS)), re.IGNORECASE)
 MARKDOWN_PARAGRAPH_TAG = "<p>"
 MARKDOWN_CODE_TAG = "<code>"
 MARKDOWN_SMALL_TAG = "<s>"
 MARKDOWN_HEADER_PATTERN = "<h{0}>"
 
+# Font identifiers: the font size, or a detailed string when granular details are used
+FontIdentifier = Union[float, str]
+
+# Spans cached during font analysis as (size, font, text), grouped per text block
+CachedSpan = Tuple[float, str, str]
+CachedBlock = List[CachedSpan]
+# Extracted text paired with its formatting tag, as (tag, content)
+TaggedText = Tuple[str, str]
+
 
 @dataclass
 class FontMetrics:
@@ -31,18 +54,18 @@ class FontMetrics:
     flags: int = 0
     color: int = 0
 
-    def create_identifier(self, include_color_and_flags: bool = False) -> str:
+    def create_identifier(self, include_color_and_flags: bool = False) -> FontIdentifier:
         """Generate unique identifier for font metrics."""
         if include_color_and_flags:
             return f"{self.size}_{self.flags}_{self.font}_{self.color}"
-        return str(self.size)
+        return self.size
 
 
 @dataclass
 class DocumentFontAnalysis:
     """Results of analyzing fonts in a document."""
-    font_frequencies: List[Tuple[str, int]]
-    font_styles: Dict[str, FontMetrics]
+    font_frequencies: List[Tuple[FontIdentifier, int]]
+    font_styles: Dict[FontIdentifier, FontMetrics]
 
     def is_empty(self) -> bool:
         """Check if analysis found any fonts."""
@@ -59,30 +82,173 @@ def extract_font_metrics_from_span(span: Dict, include_granular_details: bool =
     )
 
 
-def analyze_document_fonts(doc: fitz.Document, include_granular_details: bool = False) -> DocumentFontAnalysis:
-    """Extract and analyze fonts used throughout a document."""
-    font_styles: Dict[str, FontMetrics] = {}
-    font_count_map: Dict[str, int] = {}
+def create_span_identifier(span: Dict, include_granular_details: bool = False) -> FontIdentifier:
+    """Generate the font metrics identifier of a span without building FontMetrics."""
+    if include_granular_details:
+        return f"{span['size']}_{span.get('flags', 0)}_{span['font']}_{span.get('color', 0)}"
+    return span['size']
 
-    for page in doc:
+
+def stream_pages(doc: fitz.Document, start: int = 0,
+                 stop: Optional[int] = None) -> Iterator[Tuple[float, List[Dict]]]:
+    """Yield the height and text blocks of every readable page in a page range."""
+    for page in doc.pages(start, stop):
         try:
-            blocks = page.get_text("dict")["blocks"]
+            textpage = page.get_textpage(flags=TEXTPAGE_FLAGS)
+            blocks = page.get_text("dict", textpage=textpage)["blocks"]
         except Exception:
             continue
 
+        textpage = None  # Release the MuPDF text page before handing out blocks
+
+        yield page.rect.height, blocks
+
+
+# Result of scanning pages: span counts per identifier, font styles and cached text blocks
+PageScanResult = Tuple[Counter, Dict[FontIdentifier, FontMetrics], List[CachedBlock]]
+
+
+def _scan_pages(doc: fitz.Document, include_granular_details: bool, cache_blocks: bool,
+                start: int = 0, stop: Optional[int] = None) -> PageScanResult:
+    """Count fonts and optionally cache text blocks for a range of pages."""
+    first_span_by_identifier: Dict[FontIdentifier, Dict] = {}
+    font_count_map: Counter = Counter()
+    text_blocks: List[CachedBlock] = []
+    margins = DocumentProcessor.get_margins_for_document(doc)
+    filter_margins = not DocumentProcessor.should_skip_margin_filtering(doc)
+    header_limit = margins.header
+
+    for page_height, blocks in stream_pages(doc, start, stop):
+        footer_limit = page_height - margins.footer
+
         for block in blocks:
             if block['type'] != TEXT_BLOCK_TYPE:
                 continue
 
+            cached_spans: Optional[CachedBlock] = None
+            if cache_blocks:
+                # Skip headers and footers in PDFs
+                _, block_top, _, block_bottom = block["bbox"]
+                if not filter_margins or (header_limit <= block_top and block_bottom <= footer_limit):
+                    cached_spans = []
+                    text_blocks.append(cached_spans)
+
             for line in block["lines"]:
                 for span in line["spans"]:
-                    metrics = extract_font_metrics_from_span(span, include_granular_details)
-                    identifier = metrics.create_identifier(include_granular_details)
+                    size = span['size']
+                    if include_granular_details:
+                        identifier = create_span_identifier(span, include_granular_details)
+                    else:
+                        identifier = size
 
-                    font_styles[identifier] = metrics
-                    font_count_map[identifier] = font_count_map.get(identifier, 0) + 1
+                    if identifier not in first_span_by_identifier:
+                        first_span_by_identifier[identifier] = span
+                    font_count_map[identifier] += 1
+
+                    if cached_spans is not None:
+                        # Share the few distinct font names and frequent tiny texts
+                        text = span['text']
+                        if len(text) <= MAX_INTERNED_TEXT_LENGTH:
+                            text = sys.intern(text)
+                        cached_spans.append((size, sys.intern(span['font']), text))
+
+    # Build FontMetrics once per unique identifier rather than once per span
+    font_styles = {
+        identifier: extract_font_metrics_from_span(span, include_granular_details)
+        for identifier, span in first_span_by_identifier.items()
+    }
+
+    return font_count_map, font_styles, text_blocks
+
+
+# Document opened once per worker process by _init_page_worker
+_worker_document: Optional[fitz.Document] = None
+
+
+def _init_page_worker(file_path: str) -> None:
+    """Open the document in a worker process; MuPDF contexts are per process."""
+    global _worker_document
+    _worker_document = fitz.open(file_path)
+
+
+def _scan_page_range(task: Tuple[int, int, bool, bool]) -> PageScanResult:
+    """Scan a (start, stop) page range of the worker's document."""
+    start, stop, include_granular_details, cache_blocks = task
+    return _scan_pages(_worker_document, include_granular_details, cache_blocks, start, stop)
+
+
+def _split_page_range(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """Split page numbers into contiguous (start, stop) ranges of near-equal size."""
+    range_size, remainder = divmod(page_count, parts)
+    ranges = []
+    start = 0
+
+    for index in range(parts):
+        stop = start + range_size + (1 if index < remainder else 0)
+        ranges.append((start, stop))
+        start = stop
+
+    return ranges
+
+
+def _get_worker_count(doc: fitz.Document, source_path: Optional[str]) -> int:
+    """Determine how many processes should scan the document (1 means in-process).
+
+    Only PDFs are split: reflowable formats (EPUB, MOBI, FB2, ...) would be laid
+    out again in full by every worker before it could reach its page range.
+    """
+    if not doc.is_pdf or not source_path or not os.path.isfile(source_path):
+        return 1
+    return max(1, min(os.cpu_count() or 1, doc.page_count // MIN_PAGES_PER_WORKER))
+
+
+def _scan_document(doc: fitz.Document, include_granular_details: bool,
+                   cache_blocks: bool, source_path: Optional[str]) -> PageScanResult:
+    """Scan all pages, splitting large documents across worker processes."""
+    worker_count = _get_worker_count(doc, source_path)
+    if worker_count == 1:
+        return _scan_pages(doc, include_granular_details, cache_blocks)
+
+    tasks = [
+        (start, stop, include_granular_details, cache_blocks)
+        for start, stop in _split_page_range(doc.page_count, worker_count)
+    ]
+    with multiprocessing.Pool(worker_count, initializer=_init_page_worker,
+                              initargs=(source_path,)) as pool:
+        results = pool.map(_scan_page_range, tasks)
+
+    font_styles: Dict[FontIdentifier, FontMetrics] = {}
+    font_count_map: Counter = Counter()
+    text_blocks: List[CachedBlock] = []
+
+    # pool.map keeps task order, so blocks are merged in page order
+    for range_counts, range_styles, range_blocks in results:
+        font_count_map += range_counts
+        for identifier, metrics in range_styles.items():
+            font_styles.setdefault(identifier, metrics)
+        text_blocks.extend(range_blocks)
+
+    return font_count_map, font_styles, text_blocks
+
+
+def analyze_document_fonts(doc: fitz.Document, include_granular_details: bool = False,
+                           text_blocks: Optional[List[CachedBlock]] = None,
+                           source_path: Optional[str] = None) -> DocumentFontAnalysis:
+    """Extract and analyze fonts used throughout a document.
+
+    If ``text_blocks`` is given, the spans of every block clear of the header
+    and footer margins are cached into it so tagging does not re-read the document.
+    Large documents are scanned by several worker processes, which reopen the
+    file at ``source_path`` (defaults to ``doc.name``; needed for in-memory documents).
+    """
+    font_count_map, font_styles, cached_blocks = _scan_document(
+        doc, include_granular_details, cache_blocks=text_blocks is not None,
+        source_path=source_path or doc.name
+    )
+    if text_blocks is not None:
+        text_blocks.extend(cached_blocks)
 
-    sorted_frequencies = sorted(font_count_map.items(), key=itemgetter(1), reverse=True)
+    sorted_frequencies = font_count_map.most_common()
 
     return DocumentFontAnalysis(
         font_frequencies=sorted_frequencies,
@@ -96,20 +262,20 @@ class FontSizeTagMapping:
     size_to_tag: Dict[float, str]
 
     @staticmethod
-    def build_from_fonts(font_frequencies: List[Tuple[str, int]], 
-                        font_styles: Dict[str, FontMetrics]) -> "FontSizeTagMapping":
+    def build_from_fonts(font_frequencies: List[Tuple[FontIdentifier, int]], 
+                        font_styles: Dict[FontIdentifier, FontMetrics]) -> "FontSizeTagMapping":
         """Build font-to-tag mapping from font analysis."""
         if not font_frequencies:
             return FontSizeTagMapping(size_to_tag={})
 
         paragraph_size = _extract_paragraph_size(font_frequencies, font_styles)
-        font_sizes = _extract_unique_font_sizes(font_frequencies)
+        font_sizes = _extract_unique_font_sizes(font_frequencies, font_styles)
         
         size_to_tag = {}
         header_level = 0
         
         for size in font_sizes:
-            tag = _determine_tag_for_size(size, paragraph_size, header_level, font_styles)
+            tag = _determine_tag_for_size(size, paragraph_size, header_level)
             size_to_tag[size] = tag
             
             if tag.startswith('<h'):
@@ -118,32 +284,24 @@ class FontSizeTagMapping:
         return FontSizeTagMapping(size_to_tag=size_to_tag)
 
 
-def _extract_paragraph_size(font_frequencies: List[Tuple[str, int]], 
-                            font_styles: Dict[str, FontMetrics]) -> float:
+def _extract_paragraph_size(font_frequencies: List[Tuple[FontIdentifier, int]], 
+                            font_styles: Dict[FontIdentifier, FontMetrics]) -> float:
     """Extract the most frequently used font size (paragraph size)."""
     most_used_identifier = font_frequencies[0][0]
     return font_styles[most_used_identifier].size
 
 
-def _extract_unique_font_sizes(font_frequencies: List[Tuple[str, int]]) -> List[float]:
+def _extract_unique_font_sizes(font_frequencies: List[Tuple[FontIdentifier, int]],
+                               font_styles: Dict[FontIdentifier, FontMetrics]) -> List[float]:
     """Extract and sort unique font sizes in descending order."""
-    font_sizes = [float(identifier) for identifier, _ in font_frequencies]
-    font_sizes_unique = list(set(font_sizes))
-    font_sizes_unique.sort(reverse=True)
-    return font_sizes_unique
+    return sorted({font_styles[identifier].size for identifier, _ in font_frequencies}, reverse=True)
 
 
-def _determine_tag_for_size(size: float, paragraph_size: float, 
-                            header_level: int, font_styles: Dict[str, FontMetrics]) -> str:
+def _determine_tag_for_size(size: float, paragraph_size: float, header_level: int) -> str:
     """Determine Markdown tag for a given font size."""
-    identifier = str(size)
-    if identifier not in font_styles:
-        return MARKDOWN_PARAGRAPH_TAG
-    
-    font_style = font_styles[identifier]
-    if font_style.size == paragraph_size:
+    if size == paragraph_size:
         return MARKDOWN_PARAGRAPH_TAG
-    elif font_style.size > paragraph_size:
+    elif size > paragraph_size:
         return f"<h{header_level + 1}>"
     else:
         return MARKDOWN_SMALL_TAG
@@ -156,29 +314,22 @@ class PageMargins:
     footer: int = PDF_FOOTER_MARGIN
 
 
-@dataclass
-class TextSpan:
-    """Represents extracted text with its formatting tag."""
-    tag: str
-    content: str
-
-
 class DocumentProcessor:
     """Processes documents and extracts structured text content."""
     
-    CODE_FONT_KEYWORDS = ("mono", "courier", "code", "consolas")
+    CODE_FONT_KEYWORDS = CODE_FONT_KEYWORDS
     MAX_HEADER_LEVEL = 4
     
     @staticmethod
     def should_skip_margin_filtering(document: fitz.Document) -> bool:
         """Check if margin filtering should be disabled based on file type."""
-        return not document.name.lower().endswith(".pdf")
+        return not document.is_pdf
     
     @staticmethod
+    @functools.lru_cache(maxsize=64)
     def is_code_font(font_name: str) -> bool:
         """Check if font indicates code block."""
-        font_lower = font_name.lower()
-        return any(keyword in font_lower for keyword in DocumentProcessor.CODE_FONT_KEYWORDS)
+        return _CODE_FONT_RE.search(font_name) is not None
     
     @staticmethod
     def get_margins_for_document(document: fitz.Document) -> PageMargins:
@@ -188,174 +339,183 @@ class DocumentProcessor:
         return PageMargins()
     
     @staticmethod
-    def extract_text_with_tags(document: fitz.Document, size_tag: Dict[float, str]) -> List[TextSpan]:
-        """Extract text blocks with corresponding Markdown tags."""
-        text_spans = []
-        margins = DocumentProcessor.get_margins_for_document(document)
-        first_span = True
-        previous_span = {}
-        current_block_tag = ""
-        current_block_content = ""
+    def extract_text_with_tags(document: fitz.Document, size_tag: Dict[float, str],
+                               text_blocks: Optional[List[CachedBlock]] = None) -> Tuple[List[str], List[str]]:
+        """Extract text blocks with corresponding Markdown tags.
+
+        Returns parallel lists of tags and contents. Pass the ``text_blocks``
+        cached by :func:`analyze_document_fonts` to avoid parsing the document
+        a second time.
+        """
+        tags: List[str] = []
+        contents: List[str] = []
+
+        for tag, content in DocumentProcessor.iter_text_with_tags(document, size_tag, text_blocks):
+            tags.append(tag)
+            contents.append(content)
+
+        return tags, contents
+    
+    @staticmethod
+    def iter_text_with_tags(document: fitz.Document, size_tag: Dict[float, str],
+                            text_blocks: Optional[List[CachedBlock]] = None) -> Iterator[TaggedText]:
+        """Yield text blocks with corresponding Markdown tags one at a time."""
+        if text_blocks is None:
+            text_blocks = []
+            analyze_document_fonts(document, text_blocks=text_blocks)
+
+        # Documents use few distinct (font, size) pairs, so tag each pair only once
+        tag_cache: Dict[Tuple[str, float], str] = {}
+        tag_span = DocumentProcessor._make_span_tagger(size_tag)
         
-        for page in document:
-            try:
-                blocks = page.get_text("dict")["blocks"]
-            except Exception:
-                continue
-            
-            page_height = page.rect.height
-            
-            for block in blocks:
-                if block['type'] != TEXT_BLOCK_TYPE:
-                    continue
-                
-                # Skip headers and footers in PDFs
-                if not DocumentProcessor.should_skip_margin_filtering(document):
-                    bbox = block["bbox"]
-                    if bbox[1] < margins.header or bbox[3] > (page_height - margins.footer):
-                        continue
+        for block_spans in text_blocks:
+            # Every block starts a new run, so each run is flushed exactly once:
+            # on a tag transition inside the block or when the block ends
+            current_block_tag: Optional[str] = None
+            current_block_content = ""
+            previous_font = ""
+
+            for size, font, text in block_spans:
+                span_tag = tag_cache.get((font, size))
+                if span_tag is None:
+                    span_tag = tag_span(font, size)
+                    tag_cache[(font, size)] = span_tag
                 
-                for line in block["lines"]:
-                    for span in line["spans"]:
-                        span_tag = DocumentProcessor._get_span_tag(span, size_tag)
-                        
-                        if first_span:
-                            previous_span = span
-                            first_span = False
-                            current_block_tag = span_tag
-                            current_block_content = span["text"]
-                        else:
-                            if span_tag == current_block_tag:
-                                current_block_content = DocumentProcessor._append_to_block(
-                                    current_block_content, span, previous_span
-                                )
-                            else:
-                                if current_block_content.strip():
-                                    text_spans.append(TextSpan(
-                                        tag=current_block_tag,
-                                        content=current_block_content
-                                    ))
-                                current_block_content = span["text"]
-                                current_block_tag = span_tag
-                        
-                        previous_span = span
+                if span_tag == current_block_tag:
+                    current_block_content = DocumentProcessor._append_to_block(
+                        current_block_content, text, font, previous_font
+                    )
+                else:
+                    if current_block_content.strip():
+                        yield current_block_tag, current_block_content
+                    current_block_content = text
+                    current_block_tag = span_tag
                 
-                if current_block_content.strip():
-                    text_spans.append(TextSpan(
-                        tag=current_block_tag,
-                        content=current_block_content
-                    ))
-                    current_block_content = ""
-        
-        return text_spans
+                previous_font = font
+            
+            if current_block_content.strip():
+                yield current_block_tag, current_block_content
     
     @staticmethod
-    def _get_span_tag(span: Dict, size_tag: Dict[float, str]) -> str:
-        """Determine tag for a span based on font and size."""
-        if DocumentProcessor.is_code_font(span['font']):
-            return MARKDOWN_CODE_TAG
-        
-        return size_tag.get(span['size'], MARKDOWN_PARAGRAPH_TAG)
+    def _make_span_tagger(size_tag: Dict[float, str]) -> Callable[[str, float], str]:
+        """Build a function that tags a span by font and size for one document."""
+        # Bind lookups once so the returned closure only touches its own cells
+        is_code_font = DocumentProcessor.is_code_font
+        get_size_tag = size_tag.get
+        code_tag = MARKDOWN_CODE_TAG
+        paragraph_tag = MARKDOWN_PARAGRAPH_TAG
+
+        def tag_span(font: str, size: float) -> str:
+            if is_code_font(font):
+                return code_tag
+            return get_size_tag(size, paragraph_tag)
+
+        return tag_span
     
     @staticmethod
-    def _append_to_block(current_content: str, current_span: Dict, previous_span: Dict) -> str:
+    def _append_to_block(current_content: str, text: str, font: str, previous_font: str) -> str:
         """Append span text to block content, handling spacing."""
-        text = current_span['text']
-        
         if text != " ":
-            if previous_span['font'] == current_span['font']:
+            if previous_font == font:
                 return current_content + (" " + text if text else "")
             return current_content + " " + text
         
         return current_content
 
 
-def format_markdown(text_spans: List[TextSpan]) -> str:
+def format_markdown(tags: List[str], contents: List[str]) -> str:
     """Convert tagged content to clean Markdown."""
-    markdown_output = ""
+    return "".join(iter_markdown(zip(tags, contents)))
+
+
+def iter_markdown(tagged_text: Iterable[TaggedText]) -> Iterator[str]:
+    """Convert tagged content to clean Markdown, yielding it in chunks."""
+    parts: List[str] = []
     in_code_block = False
 
-    for text_span in text_spans:
-        content = text_span.content.strip()
+    for tag, content in tagged_text:
+        # Trim and collapse whitespace in a single split/join pass
+        content = " ".join(content.split())
         if not content:
             continue
-        
-        # Clean up excessive whitespace
-        content = re.sub(r'\s+', ' ', content)
 
-        if MARKDOWN_CODE_TAG in text_span.tag:
-            markdown_output = _append_code_block(markdown_output, content, in_code_block)
+        if MARKDOWN_CODE_TAG in tag:
+            _append_code_block(parts, content, in_code_block)
             in_code_block = True
         else:
             if in_code_block:
-                markdown_output += "```\n\n"
+                parts.append("```\n\n")
                 in_code_block = False
 
-            markdown_output = _append_formatted_content(markdown_output, text_span.tag, content)
+            _append_formatted_content(parts, tag, content)
+
+        if len(parts) >= MARKDOWN_CHUNK_PARTS:
+            yield "".join(parts)
+            parts.clear()
     
     if in_code_block:
-        markdown_output += "```\n"
+        parts.append("```\n")
 
-    return markdown_output
+    if parts:
+        yield "".join(parts)
 
 
-def _append_code_block(output: str, content: str, in_code_block: bool) -> str:
+def _append_code_block(parts: List[str], content: str, in_code_block: bool) -> None:
     """Append content to code block, opening if needed."""
     if not in_code_block:
-        output += "\n```\n"
-    output += f"{content}\n"
-    return output
+        parts.append("\n```\n")
+    parts.append(f"{content}\n")
 
 
-def _append_formatted_content(output: str, tag: str, content: str) -> str:
+def _append_formatted_content(parts: List[str], tag: str, content: str) -> None:
     """Append formatted content based on tag type."""
     if "<h" in tag:
-        return _append_header(output, tag, content)
+        _append_header(parts, tag, content)
     elif MARKDOWN_SMALL_TAG in tag:
-        return output + f"*{content}*\n\n"
+        parts.append(f"*{content}*\n\n")
     else:
-        return output + f"{content}\n\n"
+        parts.append(f"{content}\n\n")
 
 
-def _append_header(output: str, tag: str, content: str) -> str:
+def _append_header(parts: List[str], tag: str, content: str) -> None:
     """Append header content with appropriate Markdown level."""
     try:
-        level = int(re.findall(r'\d+', tag)[0])
-        # Cap header level at MAX_HEADER_LEVEL
-        level = min(level, DocumentProcessor.MAX_HEADER_LEVEL)
-        prefix = "#" * level
-        output += f"\n{prefix} {content}\n\n"
-    except IndexError:
-        output += f"{content}\n\n"
-    
-    return output
+        # Header tags have the fixed form "<hN>"
+        level = int(tag[2:-1])
+    except ValueError:
+        parts.append(f"{content}\n\n")
+        return
+
+    # Cap header level at MAX_HEADER_LEVEL
+    level = min(level, DocumentProcessor.MAX_HEADER_LEVEL)
+    prefix = "#" * level
+    parts.append(f"\n{prefix} {content}\n\n")
 
 
-def convert_document_to_markdown(file_path: str, output_path: str) -> None:
-    """Convert a document to Markdown format."""
+def convert_document_to_markdown(file_path: str, output_path: str,
+                                 use_markdown_extractor: bool = False) -> None:
+    """Convert a document to Markdown format.
+
+    With ``use_markdown_extractor``, PDFs are converted by the optional
+    pymupdf4llm package instead of the built-in font analysis.
+    """
     print(f"Processing {file_path}...")
     
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File '{file_path}' not found.")
 
     try:
-        document = fitz.open(file_path)
-        font_analysis = analyze_document_fonts(document, include_granular_details=False)
-        
-        if font_analysis.is_empty():
-            raise ValueError("No text found. This document might be scanned (images only).")
-
-        size_tag_mapping = FontSizeTagMapping.build_from_fonts(
-            font_analysis.font_frequencies,
-            font_analysis.font_styles
-        )
-        text_spans = DocumentProcessor.extract_text_with_tags(
-            document,
-            size_tag_mapping.size_to_tag
-        )
-        markdown_content = format_markdown(text_spans)
+        document = _open_document(file_path, use_markdown_extractor)
+
+        if _uses_markdown_extractor(document, use_markdown_extractor):
+            markdown_content = _convert_with_markdown_extractor(document)
+            if not markdown_content.strip():
+                raise ValueError("No text found. This document might be scanned (images only).")
+            markdown_chunks: Iterable[str] = [markdown_content]
+        else:
+            markdown_chunks = _convert_with_font_analysis(document, file_path)
         
-        _write_markdown_file(output_path, markdown_content)
+        _write_markdown_file(output_path, markdown_chunks)
         print(f"Success! Markdown saved to: {output_path}")
         
     except FileNotFoundError:
@@ -368,17 +528,97 @@ def convert_document_to_markdown(file_path: str, output_path: str) -> None:
         traceback.print_exc()
 
 
-def _write_markdown_file(output_path: str, content: str) -> None:
-    """Write Markdown content to a file."""
+def _open_document(file_path: str, use_markdown_extractor: bool = False) -> fitz.Document:
+    """Open a document, reading files below MAX_IN_MEMORY_FILE_SIZE into memory first.
+
+    The choice is made from the file's size and type before opening, so the
+    document is parsed only once. PDFs that may be split across worker processes
+    stay opened by path: every worker reopens the file itself, so a buffer would
+    only add memory.
+    """
+    file_type = os.path.splitext(file_path)[1].lstrip(".").lower()
+    if (not file_type or os.path.getsize(file_path) >= MAX_IN_MEMORY_FILE_SIZE
+            or _may_scan_in_worker_processes(file_type, use_markdown_extractor)):
+        return fitz.open(file_path)
+
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    return fitz.open(stream=data, filetype=file_type)
+
+
+def _may_scan_in_worker_processes(file_type: str, use_markdown_extractor: bool) -> bool:
+    """Check, before opening, whether the document's pages could be scanned by worker processes."""
+    return file_type == "pdf" and not use_markdown_extractor and (os.cpu_count() or 1) > 1
+
+
+def _uses_markdown_extractor(document: fitz.Document, use_markdown_extractor: bool) -> bool:
+    """Check if the document is converted by the opt-in pymupdf4llm extractor."""
+    return use_markdown_extractor and not DocumentProcessor.should_skip_margin_filtering(document)
+
+
+def _convert_with_markdown_extractor(document: fitz.Document) -> str:
+    """Convert a PDF to Markdown with pymupdf4llm, dropping page headers and footers."""
+    try:
+        import pymupdf4llm
+    except ImportError:
+        raise ValueError("The Markdown extractor requires pymupdf4llm (pip install pymupdf4llm).")
+
+    # Layout mode (the default when pymupdf_layout is installed) ignores margins, runs
+    # OCR and is far slower; switch pymupdf4llm (process-wide) to its classic extractor,
+    # which honours the header/footer margins
+    if hasattr(pymupdf4llm, "use_layout"):
+        pymupdf4llm.use_layout(False)
+
+    return pymupdf4llm.to_markdown(document, margins=(0, PDF_HEADER_MARGIN, 0, PDF_FOOTER_MARGIN))
+
+
+def _convert_with_font_analysis(document: fitz.Document, source_path: str) -> Iterator[str]:
+    """Convert a document to Markdown chunks using font analysis and tagging.
+
+    Font analysis runs eagerly so errors surface before the output file is
+    opened; tagging and formatting are streamed as the chunks are consumed.
+    """
+    text_blocks: List[CachedBlock] = []
+    font_analysis = analyze_document_fonts(
+        document,
+        include_granular_details=False,
+        text_blocks=text_blocks,
+        source_path=source_path
+    )
+    
+    if font_analysis.is_empty():
+        raise ValueError("No text found. This document might be scanned (images only).")
+
+    size_tag_mapping = FontSizeTagMapping.build_from_fonts(
+        font_analysis.font_frequencies,
+        font_analysis.font_styles
+    )
+    tagged_text = DocumentProcessor.iter_text_with_tags(
+        document,
+        size_tag_mapping.size_to_tag,
+        text_blocks
+    )
+    return iter_markdown(tagged_text)
+
+
+def _write_markdown_file(output_path: str, chunks: Iterable[str]) -> None:
+    """Write Markdown content to a file chunk by chunk."""
     with open(output_path, 'w', encoding='utf-8') as file:
-        file.write(content)
+        for chunk in chunks:
+            file.write(chunk)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python book_to_md.py <input_file> [output.md]")
+    arguments = [argument for argument in sys.argv[1:] if argument != MARKDOWN_EXTRACTOR_FLAG]
+    if not arguments:
+        print(f"Usage: python book_to_md.py <input_file> [output.md] [{MARKDOWN_EXTRACTOR_FLAG}]")
         print("Supported formats: PDF, EPUB, MOBI, FB2, XPS")
+        print(f"{MARKDOWN_EXTRACTOR_FLAG}: convert PDFs with pymupdf4llm (must be installed)")
     else:
-        input_file = sys.argv[1]
-        output_md = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_OUTPUT_FILENAME
-        convert_document_to_markdown(input_file, output_md)
\ No newline at end of file
+        input_file = arguments[0]
+        output_md = arguments[1] if len(arguments) > 1 else DEFAULT_OUTPUT_FILENAME
+        convert_document_to_markdown(
+            input_file,
+            output_md,
+            use_markdown_extractor=MARKDOWN_EXTRACTOR_FLAG in sys.argv[1:]
+        )
\ No newline at end of file
@@ -0,0 +1,123 @@
+import fitz
+import pytest
+
+import book_to_md
+
+
+def _write_sample_pdf(path, page_count=3):
+    """Write a PDF with a running header, a heading, body text and a page number per page."""
+    doc = fitz.open()
+    for page_number in range(page_count):
+        page = doc.new_page()
+        page.insert_text((72, 30), f"Running header {page_number}", fontsize=9)
+        page.insert_text((72, 100), f"Chapter {page_number}", fontsize=20)
+        for line in range(6):
+            page.insert_text((72, 140 + line * 14), f"Body text line {line} of page {page_number}.", fontsize=11)
+        page.insert_text((300, 820), f"Page {page_number + 1}", fontsize=9)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_markdown_extractor_drops_running_headers_and_footers(tmp_path):
+    pytest.importorskip("pymupdf4llm")
+    pdf_path = tmp_path / "sample.pdf"
+    _write_sample_pdf(pdf_path)
+
+    markdown = book_to_md._convert_with_markdown_extractor(fitz.open(str(pdf_path)))
+
+    assert "Chapter 0" in markdown
+    assert "Running header" not in markdown
+    assert "Page 1" not in markdown
+
+
+def test_font_analysis_drops_running_headers_and_footers(tmp_path):
+    pdf_path = tmp_path / "sample.pdf"
+    _write_sample_pdf(pdf_path)
+
+    markdown = "".join(book_to_md._convert_with_font_analysis(fitz.open(str(pdf_path)), str(pdf_path)))
+
+    assert "# Chapter 0" in markdown
+    assert "Running header" not in markdown
+    assert "Page 1" not in markdown
+
+
+def test_granular_font_analysis_builds_same_size_mapping(tmp_path):
+    pdf_path = tmp_path / "sample.pdf"
+    _write_sample_pdf(pdf_path)
+    doc = fitz.open(str(pdf_path))
+
+    mappings = []
+    for include_granular_details in (False, True):
+        analysis = book_to_md.analyze_document_fonts(doc, include_granular_details=include_granular_details)
+        mappings.append(book_to_md.FontSizeTagMapping.build_from_fonts(
+            analysis.font_frequencies,
+            analysis.font_styles
+        ).size_to_tag)
+
+    assert mappings[0] == mappings[1]
+    assert mappings[0][20.0] == "<h1>"
+    assert mappings[0][11.0] == book_to_md.MARKDOWN_PARAGRAPH_TAG
+    assert mappings[0][9.0] == book_to_md.MARKDOWN_SMALL_TAG
+
+
+def test_open_document_reads_small_files_into_memory(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "sample.pdf"
+    _write_sample_pdf(pdf_path)
+    monkeypatch.setattr(book_to_md.os, "cpu_count", lambda: 1)
+
+    assert book_to_md._open_document(str(pdf_path)).stream is not None
+
+
+def test_open_document_parses_reflowable_files_once_from_memory(tmp_path, monkeypatch):
+    text_path = tmp_path / "sample.txt"
+    text_path.write_text("\n".join(f"Line {line}" for line in range(500)))
+    monkeypatch.setattr(book_to_md.os, "cpu_count", lambda: 4)
+
+    open_calls = []
+    original_open = book_to_md.fitz.open
+
+    def counting_open(*args, **kwargs):
+        open_calls.append((args, kwargs))
+        return original_open(*args, **kwargs)
+
+    monkeypatch.setattr(book_to_md.fitz, "open", counting_open)
+
+    assert book_to_md._open_document(str(text_path)).stream is not None
+    assert len(open_calls) == 1
+
+
+def test_open_document_keeps_path_for_parallel_scans(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "sample.pdf"
+    _write_sample_pdf(pdf_path)
+    monkeypatch.setattr(book_to_md.os, "cpu_count", lambda: 2)
+
+    assert book_to_md._open_document(str(pdf_path)).stream is None
+
+
+def test_parallel_scan_matches_in_process_scan(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "sample.pdf"
+    _write_sample_pdf(pdf_path, page_count=3 * book_to_md.MIN_PAGES_PER_WORKER + 1)
+    doc = fitz.open(str(pdf_path))
+
+    monkeypatch.setattr(book_to_md.os, "cpu_count", lambda: 1)
+    serial_blocks = []
+    serial = book_to_md.analyze_document_fonts(doc, text_blocks=serial_blocks)
+
+    monkeypatch.setattr(book_to_md.os, "cpu_count", lambda: 3)
+    assert book_to_md._get_worker_count(doc, str(pdf_path)) == 3
+    parallel_blocks = []
+    parallel = book_to_md.analyze_document_fonts(doc, text_blocks=parallel_blocks)
+
+    assert parallel.font_frequencies == serial.font_frequencies
+    assert parallel.font_styles == serial.font_styles
+    assert parallel_blocks == serial_blocks
+
+
+def test_reflowable_documents_are_scanned_in_process(tmp_path, monkeypatch):
+    text_path = tmp_path / "sample.txt"
+    text_path.write_text("\n".join(f"Line {line}" for line in range(5000)))
+    doc = fitz.open(str(text_path))
+    monkeypatch.setattr(book_to_md.os, "cpu_count", lambda: 4)
+
+    assert doc.page_count >= 4 * book_to_md.MIN_PAGES_PER_WORKER
+    assert book_to_md._get_worker_count(doc, str(text_path)) == 1